@@ -1,15 +1,23 @@
 # src/app.py
-from fastapi import FastAPI, UploadFile, File, Request
+from fastapi import FastAPI, UploadFile, File
 from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from pydantic import AliasChoices, BaseModel, ConfigDict, Field, ValidationError
+from typing import Any
 from src.factory_main import MCQPipelineFactory
-import json
+import orjson
+import aiofiles
 import asyncio
 import os
 import uvicorn
 import uuid
 from logger_setup import setup_logger, start_request_logging, end_request_logging
 
+try:
+    from fastapi.sse import EventSourceResponse, ServerSentEvent
+except ImportError:  # FastAPI without native SSE support, fall back to Starlette streaming
+    EventSourceResponse = ServerSentEvent = None
+
 # Make sure logs directory exists
 os.makedirs("logs", exist_ok=True)
 
@@ -27,14 +35,28 @@ app.add_middleware(
 )
 
 
+class MCQ(BaseModel):
+    """A generated question as streamed to the client (LLM 'options' are exposed as 'choices')."""
+    model_config = ConfigDict(extra="allow")
+
+    # LLM-provided fields are forwarded in whatever shape arrives (e.g. choices as a
+    # letter-keyed dict or a list, correct_answer as "B" or 2), as the baseline did
+    question: Any = ""
+    choices: Any = Field(default_factory=dict, validation_alias=AliasChoices("choices", "options"))
+    correct_answer: Any = ""
+    ground_truth: str = ""
+
+
 @app.post("/upload")
 async def upload_file(file: UploadFile = File(...)):
     try:
         # Save file temporarily
         os.makedirs("./assets", exist_ok=True)
         file_location = f"./assets/{file.filename}"
-        with open(file_location, "wb") as f:
-            f.write(await file.read())
+        # Stream to disk in 1 MiB chunks so memory stays flat regardless of upload size
+        async with aiofiles.open(file_location, "wb") as f:
+            while chunk := await file.read(1 << 20):
+                await f.write(chunk)
 
         return {"filename": file_location}
 
@@ -43,44 +65,76 @@ async def upload_file(file: UploadFile = File(...)):
         raise e
 
 
-@app.get("/upload_sse")
-async def upload_sse(filename: str, request: Request = None):
+async def event_generator(filename: str, delay_ms: int = 0):
+    """Run the pipeline for an uploaded file and yield questions one at a time.
+
+    Questions are yielded as MCQ models; a failure is yielded once as a
+    pre-encoded JSON string so both SSE transports can pass it through as-is.
+    """
     request_id = str(uuid.uuid4())
     log_file = start_request_logging(request_id)
     file_path = f"./assets/{filename}"
 
-    async def event_generator():
-        try:
-            logger.info(f"[{request_id}] Starting pipeline for {file_path}")
-            pipeline = MCQPipelineFactory(input_path=file_path)
-
-            # Run pipeline
-            # questions_json = pipeline.run_pipeline()
-            questions_json = pipeline.template_method_example()
-            logger.info(f"[{request_id}] Pipeline generated {len(questions_json['questions'])} questions")
-
-            # Adjust format (options -> choices)
-            for q in questions_json["questions"]:
-                if "options" in q:
-                    q["choices"] = q.pop("options")
+    try:
+        logger.info(f"[{request_id}] Starting pipeline for {file_path}")
+        pipeline = MCQPipelineFactory(input_path=file_path)
+
+        # Stream questions as each concept's LLM call completes
+        # (options -> choices is handled by the MCQ model)
+        count = 0
+        async for q in pipeline.stream_questions():
+            count += 1
+            if delay_ms > 0:
+                await asyncio.sleep(delay_ms / 1000)  # optional client-side pacing
+            try:
+                mcq = MCQ.model_validate(q)
+            except ValidationError as e:
+                # One malformed question should not end the stream for the rest
+                logger.warning(f"[{request_id}] Skipping malformed question {count}: {e}")
+                continue
+            logger.debug(f"[{request_id}] Streaming question {count}: {mcq.question or 'unknown'}")
+            yield mcq
+
+        logger.info(f"[{request_id}] Finished streaming {count} questions")
 
-            # Stream questions
-            for idx, q in enumerate(questions_json["questions"], start=1):
-                await asyncio.sleep(0.5)  # simulate streaming
-                logger.debug(f"[{request_id}] Streaming question {idx}: {q.get('question', 'unknown')}")
-                yield f"data: {json.dumps(q)}\n\n"
+    except Exception as e:
+        logger.error(f"[{request_id}] Error in SSE pipeline: {e}", exc_info=True)
+        yield orjson.dumps({"error": str(e)}).decode()
 
-            logger.info(f"[{request_id}] Finished streaming {len(questions_json['questions'])} questions")
+    finally:
+        end_request_logging(request_id)
 
-        except Exception as e:
-            logger.error(f"[{request_id}] Error in SSE pipeline: {e}", exc_info=True)
-            yield f"data: {json.dumps({'error': str(e)})}\n\n"
 
-        finally:
-            end_request_logging(request_id)
+if EventSourceResponse is not None:
+    @app.get("/upload_sse", response_class=EventSourceResponse)
+    async def upload_sse(filename: str, delay_ms: int = 0):
+        # FastAPI serializes each event through pydantic-core
+        async for item in event_generator(filename, delay_ms):
+            if isinstance(item, str):
+                yield ServerSentEvent(raw_data=item)
+            else:
+                yield ServerSentEvent(data=item)
+else:
+    @app.get("/upload_sse")
+    async def upload_sse(filename: str, delay_ms: int = 0):
+        async def encode_events():
+            async for item in event_generator(filename, delay_ms):
+                data = item if isinstance(item, str) else item.model_dump_json()
+                yield f"data: {data}\n\n"
 
-    return StreamingResponse(event_generator(), media_type="text/event-stream")
+        return StreamingResponse(encode_events(), media_type="text/event-stream")
 
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Handlers must not block the event loop (pipeline construction, FAISS build):
+    # offload such work with run_in_executor / asyncio.to_thread so every worker stays responsive.
+    # Each worker is a separate process with its own copy of the embedding model and its own
+    # FAISS/OpenMP thread pool, so scale WORKERS with available memory (default: one worker).
+    uvicorn.run(
+        "app:app",
+        host="0.0.0.0",
+        port=8000,
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.getenv("WORKERS", "1")),
+    )
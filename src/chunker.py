@@ -3,8 +3,8 @@
 
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain.schema import Document
-from typing import List
-from src.token_counter import TokenCounter
+from typing import Dict, List
+from src.token_counter import DEFAULT as DEFAULT_TOKEN_COUNTER
 from src.utils import get_logger
 
 logger = get_logger(__name__)
@@ -13,14 +13,17 @@ logger = get_logger(__name__)
 class Chunker:
     """A token-aware document chunker using RecursiveCharacterTextSplitter."""
 
-    def __init__(self, chunk_size: int, chunk_overlap: int):
+    def __init__(self, chunk_size: int, chunk_overlap: int, min_tokens: int = 100):
         """
         Token-aware document chunker.
-        Splits documents into chunks based on token count rather than characters.
+        Splits documents into chunks based on token count rather than characters,
+        then merges adjacent chunks smaller than min_tokens.
         """
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
-        self.token_counter = TokenCounter()
+        self.min_tokens = min_tokens
+        self.max_tokens = int(1.05 * chunk_size)
+        self.token_counter = DEFAULT_TOKEN_COUNTER  # Shared encoder and length cache
 
         self.splitter = RecursiveCharacterTextSplitter(
             chunk_size=self.chunk_size,
@@ -44,19 +47,20 @@ class Chunker:
         """
         try:
             logger.info("Starting document splitting for %d documents.", len(documents))
-            # Merge all documents into a single document for splitting
-            merged_text = "\n\n".join(doc.page_content for doc in documents)
-            merged_doc = Document(
-                page_content=merged_text,
-                metadata={"source": "merged"},
-            )
-
-            logger.debug(
-                "Merged document length (tokens): %d",
-                self.token_counter.count_tokens(merged_text),
-            )
-
-            doc_chunks = self.splitter.split_documents([merged_doc])
+            # Loaders return one Document per page, so join each file's pages before
+            # splitting (otherwise every page becomes its own chunk). Grouping by source
+            # keeps per-file metadata and bounds the joined text by the largest file.
+            pages_by_source: Dict[str, List[str]] = {}
+            for doc in documents:
+                pages_by_source.setdefault(doc.metadata.get("source", "unknown"), []).append(doc.page_content)
+
+            doc_chunks = []
+            for source, pages in pages_by_source.items():
+                text = "\n\n".join(pages)
+                doc_chunks.extend(
+                    Document(page_content=chunk, metadata={"source": source})
+                    for chunk in self._merge_small_chunks(text, self.splitter.split_text(text))
+                )
 
             logger.info(
                 "Split into %d chunks (chunk_size=%d, overlap=%d)",
@@ -70,6 +74,49 @@ class Chunker:
             logger.error("Error in split_documents: %s", e, exc_info=True)
             raise RuntimeError(f"Error in split_documents: {e}") from e
 
+    def _merge_small_chunks(self, text: str, pieces: List[str]) -> List[str]:
+        """
+        Second pass over one source's splitter output: greedily merge adjacent pieces
+        when either is below min_tokens and the result fits max_tokens, then re-split
+        any piece still above max_tokens with the same separators. A merged piece is cut
+        from the source text as one span, so the overlap the splitter repeats between
+        neighbours appears in it only once.
+        """
+        merged = []  # (start, end, piece, token_count); start is None if not located in text
+        search_from = 0
+        for piece in pieces:
+            start = text.find(piece, search_from)
+            if start >= 0:
+                search_from = start + 1
+            else:
+                start = None
+            end = start + len(piece) if start is not None else None
+            tokens = self.token_counter.count_tokens(piece)
+
+            if merged:
+                prev_start, prev_end, prev_piece, prev_tokens = merged[-1]
+                if min(prev_tokens, tokens) < self.min_tokens:
+                    if prev_start is not None and start is not None:
+                        end = max(prev_end, end)
+                        combined_piece = text[prev_start:end]
+                    else:
+                        combined_piece, end = f"{prev_piece}\n\n{piece}", None
+                    combined = self.token_counter.count_tokens(combined_piece)
+                    if combined <= self.max_tokens:
+                        merged[-1] = (prev_start if end is not None else None, end, combined_piece, combined)
+                        continue
+            merged.append((start, end, piece, tokens))
+
+        result = []
+        for _, _, piece, tokens in merged:
+            if tokens > self.max_tokens:
+                result.extend(self.splitter.split_text(piece))
+            else:
+                result.append(piece)
+
+        logger.debug("Merged %d chunks into %d (min_tokens=%d, max_tokens=%d)",
+                     len(pieces), len(result), self.min_tokens, self.max_tokens)
+        return result
 
 if __name__ == "__main__":
     from src.file_processor import FileProcessor
@@ -1,58 +1,94 @@
 # src/factory_main.py
+import asyncio
 from src.mcq_generator import QuestionGenerator
 from src.file_processor import FileProcessor
 from src.chunker import Chunker
 from src.ingestion_pipeline.ingest import VectorStoreFAISS
 from src.ingestion_pipeline.retriever import PassageExtractor
 from src.llm_agent import LLMInvoke
+from src.rate_limiter import TokenBucket
 from src.map_reduce.pipeline import ConceptPipeline
 from src.utils import get_logger
 
 logger = get_logger(__name__)
 
+# Process-level singletons: the embedding model and Gemini client are loaded once
+# at import (app startup) and shared by every pipeline instead of per request.
+# Every stage calls Gemini through LLM, so its limiter (LLM_RPM / LLM_TPM) caps
+# the combined request and token rate of all of them.
+LLM = LLMInvoke(limiter=TokenBucket.from_env())
+VECTORIZER = VectorStoreFAISS()
+FILE_PROCESSOR = FileProcessor()
+CHUNKER = Chunker(chunk_size=12000, chunk_overlap=1200)
+CONCEPTS = ConceptPipeline(llm=LLM)
+
+
 class MCQPipelineFactory:
     def __init__(self, input_path: str):
         self.input_path = input_path
 
-        # Initialize components
-        self.vector_store = VectorStoreFAISS()
-        self.file_processor = FileProcessor()
-        self.chunker = Chunker(chunk_size=12000, chunk_overlap=1200)
-        self.concept_pipeline = ConceptPipeline()
-        self.llm = LLMInvoke()
+        # Shared components
+        self.vector_store = VECTORIZER
+        self.file_processor = FILE_PROCESSOR
+        self.chunker = CHUNKER
+        self.concept_pipeline = CONCEPTS
+        self.llm = LLM
 
         logger.info(f"MCQPipelineFactory initialized with input_path={input_path}")
 
-    def run_pipeline(self):
-        logger.info("Starting MCQ pipeline execution...")
-
-        # Step 1: Ingest into vector store
-        db, stats = self.vector_store.ingest(self.input_path)
-        logger.info(f"FAISS index stats: {stats}")
+    def _rank_concepts(self, documents):
+        """Chunk documents at concept granularity and run the MapReduce concept pipeline."""
+        chunks = self.chunker.split_documents(documents)
+        logger.info(f"Total chunks created: {len(chunks)} (chunk size=12000, overlap=1200)")
+        return self.concept_pipeline.run(chunks)
 
-        # Step 2: Process and chunk documents
-        documents, num_files = self.file_processor.process(self.input_path)
+    async def _prepare(self):
+        """Steps 1-3: index the input, chunk it and rank its concepts."""
+        # Step 1: Process documents once; both stages below chunk the same documents
+        documents, num_files = await asyncio.to_thread(self.file_processor.process, self.input_path)
         logger.info(f"Processed {num_files} files from {self.input_path}")
 
-        chunks = self.chunker.split_documents(documents)
-        logger.info(f"Total chunks created: {len(chunks)} (chunk size=12000, overlap=1200)")
+        # Step 2: Index small chunks for retrieval and rank concepts over big chunks.
+        # The two are independent, so run them concurrently off the event loop.
+        (db, stats), (rankings, ranked_concepts) = await asyncio.gather(
+            asyncio.to_thread(self.vector_store.index_documents, documents),
+            asyncio.to_thread(self._rank_concepts, documents),
+        )
+        logger.info(f"FAISS index stats: {stats}")
 
-        # Step 3: Extract passages and rank concepts
+        # Step 3: Extract passages and report ranked concepts
         passage_extractor = PassageExtractor(faiss_index=db.index, doc_index=db)
-        rankings, ranked_concepts = self.concept_pipeline.run(chunks)
         logger.info(f"Rankings: {rankings}")
         logger.info("Concepts ranked by importance (top concepts):")
 
         for i, concept in enumerate(ranked_concepts, 1):
             logger.debug(f"{i}. {concept['concept']}: {concept['summary']}")
 
+        return passage_extractor, ranked_concepts
+
+    async def run_pipeline(self):
+        logger.info("Starting MCQ pipeline execution...")
+        passage_extractor, ranked_concepts = await self._prepare()
+
         # Step 4: Generate MCQs
         qg = QuestionGenerator(self.llm, passage_extractor=passage_extractor)
-        questions_json = qg.generate_questions(ranked_concepts[:5], save_path="questions.json")
-        logger.info("Generated questions saved to questions.json")
+        num_saved = await qg.generate_questions_async(ranked_concepts[:5], save_path="questions.ndjson")
+        logger.info("Generated %d questions saved to questions.ndjson", num_saved)
 
         logger.info("MCQ pipeline execution completed successfully")
-        return questions_json
+        return num_saved
+
+    async def stream_questions(self):
+        """Run the pipeline and yield each question as soon as Gemini returns it."""
+        logger.info("Starting streamed MCQ pipeline execution...")
+        passage_extractor, ranked_concepts = await self._prepare()
+
+        qg = QuestionGenerator(self.llm, passage_extractor=passage_extractor)
+        async for question in qg.stream_questions(ranked_concepts[:5]):
+            yield question
+
+        logger.info("Streamed MCQ pipeline execution completed successfully")
+
     def template_method_example(self):
         # Example of a template method that could be overridden in subclasses
         temp ={
@@ -110,7 +146,7 @@ class MCQPipelineFactory:
 
 if __name__ == "__main__":
     factory = MCQPipelineFactory(".assets/notes.pdf")
-    factory.run_pipeline()
+    asyncio.run(factory.run_pipeline())
 
     
 
@@ -7,7 +7,7 @@ from langchain_community.document_loaders import (
     UnstructuredWordDocumentLoader,
     TextLoader
 )
-import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
 
 from src.utils import get_logger    
 
@@ -16,7 +16,7 @@ logger = get_logger(__name__)
 class FileProcessor:
     """
     FileProcessor handles loading documents from different file types (.pdf, .docx, .txt),
-    supports directory traversal, and can process files in parallel using multiprocessing.
+    supports directory traversal, and can process files in parallel using a thread pool.
     """
 
     def check_type(self, file_path: str) -> List[Document]:
@@ -50,13 +50,14 @@ class FileProcessor:
             return []
 
     def _process_file(self, file_path: str) -> List[Document]:
-        """Helper function to process a single file (used for multiprocessing)."""
+        """Helper function to process a single file (used by the thread pool)."""
         return self.check_type(file_path)
 
     def process(self, input_path: str) -> List[Document]:
         """
         Processes a single file or all supported files in a directory.
-        Uses multiprocessing for faster processing if multiple files are present.
+        Loads files concurrently on a thread pool if multiple files are present
+        (loading is I/O-bound, so threads avoid process startup and pickling costs).
         Returns a list of documents and the number of files processed.
         """
         logger.info("Starting processing for path: %s", input_path)
@@ -73,12 +74,12 @@ class FileProcessor:
             file_paths = [input_path]
 
         logger.info("Found %d file(s) to process.", len(file_paths))
-        num_processes = max(1, multiprocessing.cpu_count() - 2)
-        logger.debug("Using %d processes for multiprocessing.", num_processes)
+        num_workers = max(1, (os.cpu_count() or 1) - 2)
+        logger.debug("Using %d worker threads.", num_workers)
 
         all_documents = []
 
-        if num_processes <= 1 or len(file_paths) <= 1:
+        if num_workers <= 1 or len(file_paths) <= 1:
             logger.info("Processing files sequentially...")
             for file_path in file_paths:
                 try:
@@ -86,9 +87,9 @@ class FileProcessor:
                 except Exception:
                     logger.warning("Skipping file due to error: %s", file_path)
         else:
-            logger.info("Processing files in parallel using multiprocessing...")
-            with multiprocessing.Pool(processes=num_processes) as pool:
-                results = pool.map(self._process_file, file_paths)
+            logger.info("Processing files in parallel using a thread pool...")
+            with ThreadPoolExecutor(max_workers=num_workers) as executor:
+                results = list(executor.map(self._process_file, file_paths))
             all_documents = [doc for result in results for doc in result]
 
         logger.info("Processed %d files and extracted %d documents.", len(file_paths), len(all_documents))
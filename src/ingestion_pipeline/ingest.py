@@ -1,10 +1,13 @@
 # src/ingestion_pipeline/ingest.py
 from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain.schema import Document
-from sentence_transformers import SentenceTransformer
 from typing import List, Tuple, Dict
 import uuid
 import os
+import faiss
+import numpy as np
 from langchain_community.embeddings import HuggingFaceEmbeddings
 from src.utils import get_logger
 from dotenv import load_dotenv
@@ -16,8 +19,37 @@ from src.file_processor import FileProcessor
 load_dotenv()
 FAISS_PATH = os.getenv("FAISS_DB_PATH", "./faiss_db")
 
-# Initialize embedding function
-embedding_function = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_BATCH_SIZE = 64
+
+# HNSW graph parameters; corpora above IVFPQ_THRESHOLD vectors use a compressed IVFPQ index
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+IVFPQ_THRESHOLD = 100_000
+
+# Let FAISS search/build use all but one core (OpenMP defaults vary between wheels),
+# split across the uvicorn worker processes so they don't oversubscribe the CPU
+faiss.omp_set_num_threads(max(1, ((os.cpu_count() or 1) - 1) // max(1, int(os.getenv("WORKERS", "1")))))
+
+# Optional int8-quantized ONNX export of the embedding model (see onnx_embeddings.py)
+EMBEDDING_ONNX_PATH = os.getenv("EMBEDDING_ONNX_PATH")
+
+# Initialize embedding function (used by FAISS to embed queries) and the model
+# used to batch-embed document chunks. Both normalize, so inner product on the
+# index is cosine similarity.
+if EMBEDDING_ONNX_PATH:
+    from src.ingestion_pipeline.onnx_embeddings import ONNXMiniLMEmbeddings
+
+    embedding_function = ONNXMiniLMEmbeddings(EMBEDDING_ONNX_PATH, batch_size=EMBEDDING_BATCH_SIZE)
+    embedding_model = embedding_function
+else:
+    embedding_function = HuggingFaceEmbeddings(
+        model_name=EMBEDDING_MODEL_NAME,
+        encode_kwargs={"normalize_embeddings": True},
+    )
+    # Batch-encode with the SentenceTransformer the wrapper already loaded, not a second copy
+    embedding_model = embedding_function.client
 
 # Module-level logger
 logger = get_logger(__name__)
@@ -36,18 +68,29 @@ class VectorStoreFAISS:
 
         logger.info(f"Initialized VectorStoreFAISS with FAISS_PATH={self.FAISS_PATH}")
 
-    def create_chunks_from_file(self, file_path: str) -> List[Document]:
+    @staticmethod
+    def build_index(vectors: np.ndarray, dim: int) -> faiss.Index:
         """
-        Process a file and create token-aware chunks.
+        Build an inner-product ANN index over normalized vectors: HNSW for typical
+        documents, IVFPQ once the corpus reaches IVFPQ_THRESHOLD vectors.
         """
-        logger.info(f"Processing file(s) from {file_path}")
-        documents, num_files = self.file_processor.process(file_path)
-        logger.info(f"Processed {num_files} file(s) from {file_path}")
-
-        chunks = self.chunker.split_documents(documents)
-        logger.info(f"Created {len(chunks)} chunks from documents")
-
-        return chunks
+        n = len(vectors)
+        if n >= IVFPQ_THRESHOLD:
+            nlist = int(4 * np.sqrt(n))
+            quantizer = faiss.IndexFlatIP(dim)
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, 48, 8, faiss.METRIC_INNER_PRODUCT)
+            index.train(vectors)
+            index.nprobe = 16
+            logger.info(f"Building IVFPQ index (nlist={nlist}) for {n} vectors")
+        else:
+            index = faiss.IndexHNSWFlat(dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+            index.hnsw.efSearch = HNSW_EF_SEARCH
+            logger.info(f"Building HNSW index (M={HNSW_M}) for {n} vectors")
+
+        if n:
+            index.add(vectors)
+        return index
 
     def create_new_faiss_index(self, chunks: List["Document"]) -> Tuple[FAISS, Dict[str, int]]:
         """
@@ -58,15 +101,36 @@ class VectorStoreFAISS:
             logger.info("Starting FAISS index creation...")
 
             texts = [chunk.page_content for chunk in chunks]
-            metadatas = [chunk.metadata for chunk in chunks]
-            ids = [chunk.metadata.get("id", str(uuid.uuid4())) for chunk in chunks]
+            # Deterministic, readable ids ("notes.pdf:12") instead of one uuid4 per chunk
+            ids = [
+                chunk.metadata.get("id") or f"{os.path.basename(chunk.metadata.get('source', 'doc'))}:{i}"
+                for i, chunk in enumerate(chunks)
+            ]
+            # Keep the id in metadata as well: PassageExtractor fuses results on metadata["id"]
+            metadatas = [{**chunk.metadata, "id": doc_id} for chunk, doc_id in zip(chunks, ids)]
 
             logger.info(f"Preparing to embed {len(chunks)} document chunks...")
-            db = FAISS.from_texts(
-                texts=texts,
-                embedding=self.embedding_function,
-                metadatas=metadatas,
-                ids=ids
+            vectors = embedding_model.encode(
+                texts,
+                batch_size=EMBEDDING_BATCH_SIZE,
+                normalize_embeddings=True,
+                convert_to_numpy=True,
+                show_progress_bar=False,
+            )
+            index = self.build_index(
+                np.asarray(vectors, dtype=np.float32).reshape(len(texts), -1),
+                embedding_model.get_sentence_embedding_dimension(),
+            )
+
+            db = FAISS(
+                embedding_function=self.embedding_function,
+                index=index,
+                docstore=InMemoryDocstore({
+                    doc_id: Document(page_content=text, metadata=metadata)
+                    for doc_id, text, metadata in zip(ids, texts, metadatas)
+                }),
+                index_to_docstore_id=dict(enumerate(ids)),
+                distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT,
             )
             logger.info("FAISS index created successfully.")
 
@@ -95,13 +159,23 @@ class VectorStoreFAISS:
             logger.error(f"Error creating FAISS index: {e}", exc_info=True)
             raise
 
+    def index_documents(self, documents: List[Document]) -> Tuple[FAISS, Dict[str, int]]:
+        """
+        Chunk already-loaded documents at retrieval granularity and index them,
+        so callers that also need the raw documents parse the input only once.
+        """
+        chunks = self.chunker.split_documents(documents)
+        logger.info(f"Created {len(chunks)} chunks from documents")
+        return self.create_new_faiss_index(chunks)
+
     def ingest(self, file_path: str) -> Tuple[FAISS, Dict[str, int]]:
         """
         Full ingestion pipeline: process file, chunk, create FAISS index.
         """
         logger.info(f"Starting ingestion pipeline for {file_path}")
-        chunks = self.create_chunks_from_file(file_path)
-        db, stats = self.create_new_faiss_index(chunks)
+        documents, num_files = self.file_processor.process(file_path)
+        logger.info(f"Processed {num_files} file(s) from {file_path}")
+        db, stats = self.index_documents(documents)
         logger.info(f"Ingestion completed for {file_path}")
         return db, stats
 
@@ -0,0 +1,79 @@
+# src/ingestion_pipeline/onnx_embeddings.py
+# This file implements an int8-quantized ONNX Runtime backend for the MiniLM embedding model
+import os
+from typing import List
+import numpy as np
+import onnxruntime as ort
+from langchain_core.embeddings import Embeddings
+from optimum.onnxruntime import ORTModelForFeatureExtraction
+from transformers import AutoTokenizer
+from src.utils import get_logger
+
+logger = get_logger(__name__)
+
+
+class ONNXMiniLMEmbeddings(Embeddings):
+    """
+    Sentence embeddings from an int8-quantized ONNX export of all-MiniLM-L6-v2.
+
+    Produces mean-pooled, L2-normalized vectors like SentenceTransformer does, and
+    mirrors the subset of its API used for indexing (encode / get_sentence_embedding_dimension)
+    so it can stand in for both the LangChain embedding function and the batch encoder.
+
+    Export once with:
+        optimum-cli export onnx --model sentence-transformers/all-MiniLM-L6-v2 --task feature-extraction minilm-onnx/
+        optimum-cli onnxruntime quantize --onnx_model minilm-onnx --avx512 -o minilm-int8/
+    """
+
+    def __init__(self, model_dir: str, file_name: str = "model_quantized.onnx",
+                 batch_size: int = 64, max_length: int = 256):
+        self.model_dir = model_dir
+        self.batch_size = batch_size
+        self.max_length = max_length
+
+        session_options = ort.SessionOptions()
+        session_options.intra_op_num_threads = os.cpu_count() or 1
+        try:
+            self.model = ORTModelForFeatureExtraction.from_pretrained(
+                model_dir, file_name=file_name, session_options=session_options
+            )
+            self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+            logger.info("Loaded ONNX embedding model from %s (%s)", model_dir, file_name)
+        except Exception as e:
+            logger.error("Failed to load ONNX embedding model from %s: %s", model_dir, e, exc_info=True)
+            raise
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.model.config.hidden_size
+
+    def encode(self, texts: List[str], batch_size: int = None, normalize_embeddings: bool = True,
+               **kwargs) -> np.ndarray:
+        """Embed texts in batches; returns a float32 array of shape (len(texts), dim)."""
+        batch_size = batch_size or self.batch_size
+        batches = []
+        for i in range(0, len(texts), batch_size):
+            inputs = self.tokenizer(
+                texts[i:i + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors="np",
+            )
+            hidden = self.model(**inputs).last_hidden_state
+
+            # Mean pooling over non-padding tokens
+            mask = inputs["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            if normalize_embeddings:
+                pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            batches.append(pooled.astype(np.float32))
+
+        if not batches:
+            return np.empty((0, self.get_sentence_embedding_dimension()), dtype=np.float32)
+        return np.vstack(batches)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.encode(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.encode([text])[0].tolist()
@@ -1,4 +1,6 @@
-from collections import defaultdict
+from collections import OrderedDict
+import threading
+import time
 import numpy as np
 from typing import List, Tuple
 from langchain_core.documents import Document
@@ -6,36 +8,103 @@ from src.utils import get_logger
 
 logger = get_logger(__name__)
 
+
+class QueryCache:
+    """
+    Thread-safe LRU cache with a per-entry time-to-live, used to memoize
+    retrieval results keyed on (query, k).
+    """
+    def __init__(self, max_size: int = 1024, ttl: float = 300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.RLock()
+
+    def get(self, key):
+        """Return the cached value, or None if missing or expired."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
 class PassageExtractor:
     """
     Ensemble retrieval system combining FAISS, similarity search,
     and Reciprocal Rank Fusion (RRF) fusion .
     """
-    def __init__(self, faiss_index, doc_index):
+    def __init__(self, faiss_index, doc_index, cache_size: int = 1024, cache_ttl: float = 300):
         self.faiss_index = faiss_index
         self.doc_index = doc_index
+        self._cache = QueryCache(max_size=cache_size, ttl=cache_ttl)
         logger.info("PassageExtractor initialized with FAISS and doc index.")
 
+    def invalidate_cache(self):
+        """Drop cached retrievals; call after mutating the underlying index."""
+        self._cache.clear()
+
     @staticmethod
     def reciprocal_rank_fusion(results_lists, k=60):
         """Combine multiple ranked lists using Reciprocal Rank Fusion (RRF)."""
         logger.debug("Starting Reciprocal Rank Fusion (RRF)...")
-        scores, doc_mapping = defaultdict(float), {}
+        positions, docs = {}, []  # doc_id -> dense index, dense index -> document
+        idx_list, rank_list = [], []
 
         for results in results_lists:
             for rank, (doc, _) in enumerate(results):
                 doc_id = doc.metadata.get("id")
-                scores[doc_id] += 1 / (k + rank + 1)
-                doc_mapping[doc_id] = doc
+                i = positions.get(doc_id)
+                if i is None:
+                    i = positions[doc_id] = len(docs)
+                    docs.append(doc)
+                idx_list.append(i)
+                rank_list.append(rank)
+
+        if not docs:
+            return []
 
-        sorted_doc_ids = sorted(scores, key=scores.get, reverse=True)
-        logger.debug(f"RRF fusion complete. Combined {len(sorted_doc_ids)} unique documents.")
-        return [(doc_mapping[doc_id], scores[doc_id]) for doc_id in sorted_doc_ids]
+        scores = np.zeros(len(docs))
+        np.add.at(scores, np.asarray(idx_list), 1.0 / (k + np.asarray(rank_list) + 1))
+        order = np.argsort(-scores, kind="stable")
+        logger.debug(f"RRF fusion complete. Combined {len(docs)} unique documents.")
+        return [(docs[i], float(scores[i])) for i in order]
+
+    def _collect_faiss_results(self, ids, distances) -> List[Tuple[Document, float]]:
+        """Map one row of raw FAISS search output back to docstore documents."""
+        faiss_results = []
+        for idx, d in zip(ids, distances):
+            if idx >= 0:
+                doc_id = self.doc_index.index_to_docstore_id[idx]
+                doc = self.doc_index.docstore._dict[doc_id]
+                faiss_results.append((doc, float(-d)))
+        return faiss_results
 
     def retrieve(self, query: str, k: int = 5) -> List[Tuple[Document, float]]:
         """Retrieve documents using FAISS and similarity search, with RRF fusion."""
         logger.info(f"Retrieving top-{k} documents for query: {query}")
 
+        cached = self._cache.get((query, k))
+        if cached is not None:
+            logger.debug("Query cache hit.")
+            return cached
+
         results_lists = []
 
         try:
@@ -43,18 +112,14 @@ class PassageExtractor:
             logger.debug("Running FAISS search...")
             query_embedding = self.doc_index.embedding_function.embed_query(query)
             D, I = self.faiss_index.search(np.array([query_embedding], dtype=np.float32), k=k)
-            faiss_results = []
-            for idx, d in zip(I[0], D[0]):
-                if idx >= 0:
-                    doc_id = self.doc_index.index_to_docstore_id[idx]
-                    doc = self.doc_index.docstore._dict[doc_id]
-                    faiss_results.append((doc, float(-d)))
+            faiss_results = self._collect_faiss_results(I[0], D[0])
             results_lists.append(faiss_results)
             logger.debug(f"FAISS search returned {len(faiss_results)} results.")
 
             # Method 2: Similarity search
             logger.debug("Running similarity search...")
-            sim_results = self.doc_index.similarity_search_with_score(query, k=k)
+            # Reuse the query vector instead of letting the store re-embed the query
+            sim_results = self.doc_index.similarity_search_with_score_by_vector(query_embedding, k=k)
             results_lists.append([(doc, -score) for doc, score in sim_results])
             logger.debug(f"Similarity search returned {len(sim_results)} results.")
 
@@ -62,12 +127,49 @@ class PassageExtractor:
             fused_results = self.reciprocal_rank_fusion(results_lists)
             logger.info(f"Retrieved {len(fused_results)} fused results for query.")
 
+            self._cache.set((query, k), fused_results[:k])
             return fused_results[:k]
 
         except Exception as e:
             logger.error(f"Error during retrieval for query '{query}': {e}", exc_info=True)
             return []
 
+    def batch_retrieve(self, queries: List[str], k: int = 5) -> List[List[Tuple[Document, float]]]:
+        """
+        Retrieve documents for many queries at once: embeds all queries in one batch
+        and issues a single FAISS search over the (Q, d) query matrix.
+        """
+        logger.info(f"Batch retrieving top-{k} documents for {len(queries)} queries")
+        all_results = [self._cache.get((query, k)) for query in queries]
+        misses = [i for i, result in enumerate(all_results) if result is None]
+        if not misses:
+            return all_results
+
+        try:
+            query_embeddings = np.asarray(
+                self.doc_index.embedding_function.embed_documents([queries[i] for i in misses]),
+                dtype=np.float32,
+            )
+            D, I = self.faiss_index.search(query_embeddings, k=k)
+
+            for i, query_embedding, ids, distances in zip(misses, query_embeddings, I, D):
+                faiss_results = self._collect_faiss_results(ids, distances)
+                sim_results = self.doc_index.similarity_search_with_score_by_vector(
+                    query_embedding.tolist(), k=k
+                )
+                fused_results = self.reciprocal_rank_fusion(
+                    [faiss_results, [(doc, -score) for doc, score in sim_results]]
+                )
+                all_results[i] = fused_results[:k]
+                self._cache.set((queries[i], k), all_results[i])
+
+            logger.info(f"Batch retrieval complete for {len(queries)} queries ({len(misses)} cache misses).")
+            return all_results
+
+        except Exception as e:
+            logger.error(f"Error during batch retrieval: {e}", exc_info=True)
+            return [result if result is not None else [] for result in all_results]
+
     def extract(self, question: str) -> List[str]:
         """Extract top passages to answer the question."""
         logger.info(f"Extracting passages for question: {question}")
@@ -76,6 +178,12 @@ class PassageExtractor:
         logger.info(f"Extracted {len(passages)} passages for question.")
         return passages
 
+    def batch_extract(self, questions: List[str]) -> List[List[str]]:
+        """Extract top passages for several questions using a single batched search."""
+        logger.info(f"Extracting passages for {len(questions)} questions")
+        results = self.batch_retrieve(questions)
+        return [[doc.page_content for doc, _ in result] for result in results]
+
 
 if __name__ == "__main__":
     from src.ingestion_pipeline.ingest import VectorStoreFAISS
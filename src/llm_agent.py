@@ -1,8 +1,10 @@
 # src/llm_agent.py
 # This file implements the LLMInvoke class to interact with a Generative AI model
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
 from dotenv import load_dotenv
 import os
+from src.token_counter import DEFAULT as DEFAULT_TOKEN_COUNTER
 from src.utils import get_logger    
 
 logger = get_logger(__name__)
@@ -15,12 +17,23 @@ else:
     genai.configure(api_key=api_key)
     logger.info("Gemini API configured successfully.")
 
+# Provider errors worth retrying with backoff (rate limits, overload, timeouts);
+# anything else is treated as permanent.
+TRANSIENT_LLM_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.InternalServerError,
+)
+
+
 class LLMInvoke:
     """
     Handles invoking a Generative AI model and fetching responses.
     """
-    def __init__(self, model_name="gemini-2.5-flash-lite"):
+    def __init__(self, model_name="gemini-2.5-flash-lite", limiter=None):
         self.model_name = model_name
+        self.limiter = limiter  # Optional TokenBucket shared by every call to this model
         try:
             self.model = genai.GenerativeModel(model_name=self.model_name)
             logger.info("Initialized LLMInvoke with model: %s", self.model_name)
@@ -28,14 +41,53 @@ class LLMInvoke:
             logger.error("Failed to initialize LLM model %s: %s", self.model_name, e, exc_info=True)
             raise
 
-    def llm_response(self, prompt, context=None):
+    def _estimate_tokens(self, prompt):
+        # Only the token bucket needs a prompt size, so skip tokenizing without a TPM
+        # limit. Uncached: prompts are large and never repeat, so they would only crowd
+        # the splitter's entries out of the counter's length cache.
+        if not self.limiter.tpm:
+            return 0
+        return DEFAULT_TOKEN_COUNTER.count_tokens_uncached(prompt)
+
+    def llm_response(self, prompt, context=None, raise_errors=False):
         """
         Generates a response from the model for a given prompt.
-        Returns a dictionary with the answer or an error message.
+        Returns a dictionary with the answer or an error message; with raise_errors=True
+        provider errors propagate instead so callers can retry or fail fast, while a
+        blocked or empty candidate (a per-prompt outcome) yields an empty answer.
         """
         logger.debug("Generating response for prompt: %s", prompt[:100])  # log first 100 chars
+        if self.limiter:
+            self.limiter.acquire(self._estimate_tokens(prompt))
         try:
             response = self.model.generate_content(prompt)
+            try:
+                answer = response.text
+            except ValueError as e:
+                # response.text raises when the candidate has no text, e.g. finish
+                # reason SAFETY or RECITATION; retrying the same prompt won't help
+                if not raise_errors:
+                    raise
+                logger.warning("LLM returned no text for prompt: %s (%s)", prompt[:100], e)
+                return {"answer": ""}
+            logger.info("Generated LLM response successfully.")
+            return {"answer": answer}
+        except Exception as e:
+            if raise_errors:
+                raise
+            logger.error("Error generating LLM response: %s", e, exc_info=True)
+            return {"answer": f"Error processing query: {str(e)}"}
+
+    async def allm_response(self, prompt, context=None):
+        """
+        Async variant of llm_response; awaits the Gemini call without blocking the event loop.
+        Returns a dictionary with the answer or an error message.
+        """
+        logger.debug("Generating async response for prompt: %s", prompt[:100])
+        if self.limiter:
+            await self.limiter.acquire_async(self._estimate_tokens(prompt))
+        try:
+            response = await self.model.generate_content_async(prompt)
             logger.info("Generated LLM response successfully.")
             return {"answer": response.text}
         except Exception as e:
@@ -1,60 +1,101 @@
+from concurrent.futures import Executor, ThreadPoolExecutor
+from contextlib import nullcontext
 from typing import List
 import math
+import textwrap
 from src.token_counter import TokenCounter
 from src.file_processor import FileProcessor
 from src.llm_agent import LLMInvoke
 from src.chunker import Chunker
 from src.map_reduce.concept_mapper import ConceptMapper
 
+_COMBINE_PROMPT_TMPL = textwrap.dedent("""
+        Instructions:
+        You are combining multiple concept maps into a single, comprehensive summary while retaining all
+        key ideas and details. Below are several lists of main ideas and concepts extracted from a larger
+        document.
+
+        Your task is to:
+        1. Merge these lists into a single structured list, removing redundancies while keeping all unique
+        and detailed information.
+        2. Ensure all main ideas, relationships, and examples are preserved and clearly organized.
+
+        Here are the concept maps to combine:
+        Context:
+        {context}
+
+        Respond with the consolidated and organized list of main ideas and concepts.""")
+
+
 class ConceptCombiner:
     """
     Iteratively combines multiple concept lists into a single condensed set using LLM prompts,
     ensuring the total token count stays within the specified limit.
     """
-    def __init__(self, llm_invoke, counter, max_tokens: int):
+    def __init__(self, llm_invoke, counter, max_tokens: int, max_workers: int = 8,
+                 executor: Executor = None):
         self.llm_invoke = llm_invoke
         self.counter = counter
         self.max_tokens = max_tokens  # Maximum allowable tokens per LLM context
+        self.max_workers = max_workers
+        self.executor = executor  # Shared pool if given; otherwise one pool per pass
+        # Token costs of the fixed strings, counted once: the separator between sets and
+        # the prompt wrapped around them. What is left of max_tokens is the content budget.
+        self._sep_tokens = self.counter.count_tokens("\n\n")
+        self._prompt_overhead = self.counter.count_tokens(_COMBINE_PROMPT_TMPL.format(context=""))
+        self._budget = self.max_tokens - self._prompt_overhead
+
+    def _make_batches(self, current_sets: List[str], sizes: List[int]) -> List[List[str]]:
+        """
+        Token-aware greedy batching: pack consecutive sets into batches of at most
+        half the content budget. If no two sets fit together, fall back to halving
+        so every pass still reduces the number of sets.
+        """
+        budget = self._budget // 2
+        batches, batch, batch_tokens = [], [], 0
+        for text, size in zip(current_sets, sizes):
+            added = size + (self._sep_tokens if batch else 0)
+            if batch and batch_tokens + added > budget:
+                batches.append(batch)
+                batch, batch_tokens, added = [], 0, size
+            batch.append(text)
+            batch_tokens += added
+        if batch:
+            batches.append(batch)
+
+        if len(batches) == len(current_sets) > 1:
+            batch_size = math.ceil(len(current_sets) / 2)
+            batches = [current_sets[i:i+batch_size] for i in range(0, len(current_sets), batch_size)]
+        return batches
+
+    def _combine_batch(self, batch: List[str]) -> str:
+        """Condense one batch of concept maps into a single consolidated list via the LLM."""
+        prompt = _COMBINE_PROMPT_TMPL.format(context="\n\n".join(batch))
+        result = self.llm_invoke.llm_response(prompt)
+        return result["answer"]
 
     def combine_concepts(self, concepts_list: List[str]) -> str:
         """
         Merge multiple concept strings into a single organized summary.
-        Repeatedly batches and condenses until total tokens ≤ max_tokens.
+        Repeatedly batches and condenses until the total fits the content budget
+        (max_tokens minus the combine prompt overhead).
         """
         current_sets = concepts_list.copy()
 
         while True:
-            combined_text = "\n\n".join(current_sets)
-            total_tokens = self.counter.count_tokens(combined_text)
-            if total_tokens <= self.max_tokens:
+            # Sum per-set counts (one batched encode) instead of re-tokenizing the joined text
+            sizes = self.counter.count_tokens_batch(current_sets)
+            total_tokens = sum(sizes) + max(0, len(sizes) - 1) * self._sep_tokens
+            if total_tokens <= self._budget:
                 break  # Already within token limit
 
-            # Heuristic batching: split roughly in half each iteration
-            batch_size = max(1, math.ceil(len(current_sets) / 2))
-            new_sets = []
-
-            for i in range(0, len(current_sets), batch_size):
-                batch = current_sets[i:i+batch_size]
-                context = "\n\n".join(batch)
-                prompt = f"""
-                Instructions:
-                You are combining multiple concept maps into a single, comprehensive summary while retaining all
-                key ideas and details. Below are several lists of main ideas and concepts extracted from a larger
-                document.
-                
-                Your task is to:
-                1. Merge these lists into a single structured list, removing redundancies while keeping all unique
-                and detailed information.
-                2. Ensure all main ideas, relationships, and examples are preserved and clearly organized.
-                
-                Here are the concept maps to combine:
-                Context:
-                {context}
-                
-                Respond with the consolidated and organized list of main ideas and concepts."""
-
-                result = self.llm_invoke.llm_response(prompt)
-                new_sets.append(result["answer"])
+            batches = self._make_batches(current_sets, sizes)
+
+            # Condense all batches of this pass concurrently; results keep batch order
+            pool = nullcontext(self.executor) if self.executor else ThreadPoolExecutor(max_workers=self.max_workers)
+            with pool as executor:
+                futures = [executor.submit(self._combine_batch, batch) for batch in batches]
+                new_sets = [future.result() for future in futures]
 
             current_sets = new_sets  # Prepare for next iteration
 
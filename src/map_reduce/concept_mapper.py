@@ -1,62 +1,91 @@
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import List, Dict
+from concurrent.futures import Executor, ThreadPoolExecutor
+from contextlib import nullcontext
+import hashlib
+from typing import Dict, Iterator, List
 from langchain.schema import Document
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential_jitter
 from src.file_processor import FileProcessor
-from src.llm_agent import LLMInvoke
+from src.llm_agent import LLMInvoke, TRANSIENT_LLM_ERRORS
 from src.chunker import Chunker
 
 
 class ConceptMapper:
-    def __init__(self, llm_invoke, max_workers: int = 8):
+    def __init__(self, llm_invoke, max_workers: int = 8, executor: Executor = None):
         """
         Initialize the concept extractor with an LLM instance and thread pool size.
+        If an executor is given it is reused (and not shut down) instead of a per-call pool.
         """
         self.llm_invoke = llm_invoke
         self.max_workers = max_workers
+        self.executor = executor
 
+    @retry(
+        wait=wait_exponential_jitter(initial=1, max=60),
+        stop=stop_after_attempt(5),
+        retry=retry_if_exception_type(TRANSIENT_LLM_ERRORS),
+        reraise=True,
+    )
     def process_chunk(self, chunk: Document) -> Dict:
         """
         Extract main concepts from a single document chunk using the LLM.
-        Returns a dictionary with source and extracted concepts.
+        Returns a dictionary with source and extracted concepts. Transient provider
+        errors are retried with jittered exponential backoff; other errors propagate.
         """
-        try:
-            prompt = f"""
-            You are an expert educator specializing in creating detailed concept maps from academic texts.
-            Given the following excerpt from a longer document, extract the main ideas, detailed concepts, and supporting details critical to understanding the material.
+        prompt = f"""
+        You are an expert educator specializing in creating detailed concept maps from academic texts.
+        Given the following excerpt from a longer document, extract the main ideas, detailed concepts, and supporting details critical to understanding the material.
 
-            Focus on:
-            - Key concepts or terms introduced in the text.
-            - Definitions or explanations of these concepts.
-            - Relationships between concepts.
-            - Any examples or applications mentioned.
+        Focus on:
+        - Key concepts or terms introduced in the text.
+        - Definitions or explanations of these concepts.
+        - Relationships between concepts.
+        - Any examples or applications mentioned.
 
-            Context:
-            {chunk.page_content}
+        Context:
+        {chunk.page_content}
 
-            Respond with a structured list of detailed main ideas and concepts."""
+        Respond with a structured list of detailed main ideas and concepts."""
 
-            result = self.llm_invoke.llm_response(prompt)
-            return {"chunk_source": chunk.metadata.get("source", "unknown"), "concepts": result["answer"]}
+        result = self.llm_invoke.llm_response(prompt, raise_errors=True)
+        return {"chunk_source": chunk.metadata.get("source", "unknown"), "concepts": result["answer"]}
 
-        except Exception:
-            return None
-
-    def extract(self, chunks: List[Document]) -> List[Dict]:
+    def extract_iter(self, chunks: List[Document]) -> Iterator[str]:
         """
-        Extract main concepts from multiple chunks in parallel.
-        Returns a list of extracted concept dictionaries.
+        Extract main concepts from multiple chunks in parallel, issuing one LLM call
+        per distinct chunk text, and yield each chunk's concepts in chunk order as soon
+        as it is available. Chunks the LLM returns no text for are skipped; the first
+        chunk that fails with a provider error (after retries) cancels the calls still
+        queued and re-raises.
         """
-        concepts = []
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            future_to_chunk = {executor.submit(self.process_chunk, chunk): chunk for chunk in chunks}
+        # Hash each chunk's text so byte-identical chunks cost one LLM call
+        keys = [hashlib.sha1(chunk.page_content.encode()).digest() for chunk in chunks]
+        firsts = {}
+        for i, key in enumerate(keys):
+            firsts.setdefault(key, i)
 
-            for future in as_completed(future_to_chunk):
-                result = future.result()
-                if result:
-                    concepts.append(result)
+        pool = nullcontext(self.executor) if self.executor else ThreadPoolExecutor(max_workers=self.max_workers)
+        with pool as executor:
+            # map() yields in first-occurrence order, so a chunk's result is always
+            # ready by the time the walk below reaches it; if a call raises, map()
+            # cancels the pending futures before the error surfaces
+            results = zip(firsts, executor.map(self.process_chunk, (chunks[i] for i in firsts.values())))
+            concepts_by_key = {}
+            for key in keys:
+                while key not in concepts_by_key:
+                    done_key, result = next(results)
+                    # Keep only the concepts text; the per-chunk dict is dropped right away
+                    concepts_by_key[done_key] = result["concepts"]
+                # An empty answer means the LLM returned no text for this chunk (e.g. a
+                # blocked candidate): skip the chunk rather than failing the whole run
+                if concepts_by_key[key]:
+                    yield concepts_by_key[key]
 
-        # Return only the concepts from each chunk
-        return [c['concepts'] for c in concepts]
+    def extract(self, chunks: List[Document]) -> List[str]:
+        """
+        Extract main concepts from multiple chunks in parallel.
+        Returns the list of concept strings, one per chunk that produced text.
+        """
+        return list(self.extract_iter(chunks))
 
 
 # ===== Usage =====
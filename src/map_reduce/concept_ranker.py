@@ -1,5 +1,10 @@
 import re
-from typing import List, Dict
+from typing import List, Dict, Optional
+
+# Compiled once: patterns like [1, 2, 3] or Output: [1, 2, 3], and bare numbers as a fallback
+_BRACKET_RE = re.compile(r'\[([0-9,\s]+)\]')
+_NUM_RE = re.compile(r'\b\d+\b')
+_STRIP_WS = str.maketrans('', '', ' \t\n\r\f\v')
 
 class ConceptRanker:
 
@@ -35,23 +40,13 @@ class ConceptRanker:
         Parse the LLM ranking output to extract the ranking order.
         Expected format: [2, 1, 3] or similar numerical list.
         """
-        # Look for patterns like [1, 2, 3] or Output: [1, 2, 3]
-        bracket_pattern = r'\[([0-9,\s]+)\]'
-        match = re.search(bracket_pattern, ranking_result)
-        
+        match = _BRACKET_RE.search(ranking_result)
         if match:
-            # Extract numbers from the bracketed content
-            numbers_str = match.group(1)
-            rankings = [int(x.strip()) for x in numbers_str.split(',') if x.strip().isdigit()]
-            return rankings
-        
-        # Fallback: look for individual numbers in the text
-        numbers = re.findall(r'\b\d+\b', ranking_result)
-        if numbers:
-            return [int(x) for x in numbers]
-        
-        # If parsing fails, return sequential ranking as fallback
-        return []
+            # Drop all whitespace, then split; only digits and commas remain
+            return [int(x) for x in match.group(1).translate(_STRIP_WS).split(',') if x]
+
+        # Fallback: look for individual numbers in the text (empty list if none)
+        return [int(x) for x in _NUM_RE.findall(ranking_result)]
     
     def rank(self, dict_concepts: List[Dict[str, str]]) -> List[int]:
         """
@@ -107,14 +102,17 @@ class ConceptRanker:
         
         return rankings
     
-    def get_ranked_concepts(self, dict_concepts: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    def get_ranked_concepts(self, dict_concepts: List[Dict[str, str]],
+                            rankings: Optional[List[int]] = None) -> List[Dict[str, str]]:
         """
         Get concepts sorted by their importance ranking.
+        Pass rankings already returned by rank() to skip a second LLM ranking call.
         
         Returns:
             List of concept dictionaries sorted by importance (most important first)
         """
-        rankings = self.rank(dict_concepts)
+        if rankings is None:
+            rankings = self.rank(dict_concepts)
         
         # Create tuples of (ranking, concept_dict) and sort by ranking
         ranked_pairs = list(zip(rankings, dict_concepts))
@@ -161,7 +159,7 @@ if __name__ == "__main__":
     rankings = ranker.rank(reduced)
     print(f"Rankings: {rankings}")
     
-    ranked_concepts = ranker.get_ranked_concepts(reduced)
+    ranked_concepts = ranker.get_ranked_concepts(reduced, rankings)
     print("Concepts ranked by importance:")
     for i, concept in enumerate(ranked_concepts, 1):
         print(f"{i}. {concept['concept']}: {concept['summary']}")
\ No newline at end of file
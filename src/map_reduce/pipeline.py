@@ -3,13 +3,15 @@
 # It uses the ConceptMapper, ConceptCombiner, ConceptReducer, and ConceptRanker classes
 # to process text chunks and extract ranked concepts.
 
+from concurrent.futures import ThreadPoolExecutor
+
 from src.map_reduce.concept_mapper import ConceptMapper
 from src.map_reduce.concept_combiner import ConceptCombiner
 from src.map_reduce.concept_reducer import ConceptReducer
 from src.map_reduce.concept_ranker import ConceptRanker
 
 from src.llm_agent import LLMInvoke
-from src.token_counter import TokenCounter
+from src.token_counter import DEFAULT as DEFAULT_TOKEN_COUNTER
 from src.utils import get_logger
 
 logger = get_logger(__name__)
@@ -17,21 +19,36 @@ logger = get_logger(__name__)
 
 class ConceptPipeline:
     """A MapReduce pipeline for extracting and ranking concepts from text chunks."""    
-    def __init__(self, llm=None, max_workers=8, max_tokens=100000):
+    def __init__(self, llm=None, max_workers=8, max_tokens=100000, counter=None):
         self.llm = llm or LLMInvoke()
         self.max_workers = max_workers
         self.max_tokens = max_tokens
-        self.counter = TokenCounter()
+        self.counter = counter or DEFAULT_TOKEN_COUNTER
+
+        # One long-lived pool shared by the map and combine stages, so worker threads
+        # stay warm across stages and runs instead of being created per call
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="concept-pipe")
 
         # Initialize components
-        self.mapper = ConceptMapper(self.llm, max_workers=self.max_workers)
-        self.combiner = ConceptCombiner(self.llm, self.counter, self.max_tokens)
+        self.mapper = ConceptMapper(self.llm, max_workers=self.max_workers, executor=self.executor)
+        self.combiner = ConceptCombiner(self.llm, self.counter, self.max_tokens,
+                                        max_workers=self.max_workers, executor=self.executor)
         self.reducer = ConceptReducer(self.llm)
         self.ranker = ConceptRanker(self.llm)
 
         logger.info("ConceptPipeline initialized with max_workers=%d, max_tokens=%d", 
                     self.max_workers, self.max_tokens)
 
+    def close(self):
+        """Shut down the shared thread pool."""
+        self.executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
     def run(self, chunks):
         """Run the full MapReduce pipeline on text chunks."""
         logger.info("Starting concept extraction pipeline with %d chunks.", len(chunks))
@@ -55,7 +72,7 @@ class ConceptPipeline:
             # 4. Rank
             logger.debug("Step 4: Ranking concepts...")
             rankings = self.ranker.rank(reduced)
-            ranked_concepts = self.ranker.get_ranked_concepts(reduced)
+            ranked_concepts = self.ranker.get_ranked_concepts(reduced, rankings)
             logger.info("Ranked %d concepts.", len(ranked_concepts))
 
             return rankings, ranked_concepts
@@ -79,8 +96,8 @@ if __name__ == "__main__":
     chunks = chunker.split_documents(documents)
     logger.info("Created %d chunks from documents.", len(chunks))
 
-    pipeline = ConceptPipeline()
-    rankings, ranked_concepts = pipeline.run(chunks)
+    with ConceptPipeline() as pipeline:
+        rankings, ranked_concepts = pipeline.run(chunks)
 
     logger.info("Final Rankings: %s", rankings)
     logger.info("Concepts ranked by importance:")
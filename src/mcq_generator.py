@@ -1,27 +1,16 @@
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import List, Dict
-import json
+from typing import AsyncIterator, List, Dict
+import asyncio
 import re
+import textwrap
+import aiofiles
+import orjson
 from src.utils import get_logger
 
 logger = get_logger(__name__)
 
-class QuestionGenerator:
-    """
-    Generates multiple-choice questions from ranked concepts using LLMs.
-    Each question includes four answer options and a ground_truth reference.
-    """
-    def __init__(self, llm_invoke, passage_extractor, max_workers: int = 8):
-        self.llm_invoke = llm_invoke
-        self.passage_extractor = passage_extractor
-        self.max_workers = max_workers
-        logger.info("QuestionGenerator initialized with max_workers=%d", max_workers)
-
-    def _generate_single(self, concept_dict: Dict, num_questions: int) -> (str, str):
-        main_idea = f"{concept_dict['concept']}: {concept_dict['summary']}"
-        logger.debug("Generating questions for main idea: %s", main_idea[:80])
-        passages = self.passage_extractor.extract(main_idea)
-        prompt = f"""
+# Static instructions come first and the per-concept fields last, so providers with
+# prompt-prefix caching can reuse the fixed prefix across concepts
+_GEN_PROMPT = textwrap.dedent("""
         Based on the following main idea and its relevant passages, create {num_questions}
         multiple-choice questions that require deep understanding, critical thinking, and detailed analysis.
         The questions should go beyond mere factual recall, involving higher-order thinking skills like analysis,
@@ -46,58 +35,173 @@ class QuestionGenerator:
 
         Passages:
         {passages}
-        """
+        """)
+
+_JSON_SCAN_RE = re.compile(r'["\[\]\\]')
+
+
+class QuestionGenerator:
+    """
+    Generates multiple-choice questions from ranked concepts using LLMs.
+    Each question includes four answer options and a ground_truth reference.
+    """
+    def __init__(self, llm_invoke, passage_extractor, max_concurrent: int = 8):
+        self.llm_invoke = llm_invoke
+        self.passage_extractor = passage_extractor
+        self.max_concurrent = max_concurrent  # In-flight LLM requests; size to the provider's RPM budget
+        logger.info("QuestionGenerator initialized with max_concurrent=%d", max_concurrent)
+
+    @staticmethod
+    def _main_idea(concept_dict: Dict) -> str:
+        return f"{concept_dict['concept']}: {concept_dict['summary']}"
+
+    @staticmethod
+    def _build_prompt(main_idea: str, passages: List[str], num_questions: int) -> str:
+        return _GEN_PROMPT.format_map(
+            {"num_questions": num_questions, "main_idea": main_idea, "passages": passages}
+        )
+
+    async def _agenerate_single(self, concept_dict: Dict, num_questions: int, passages: List[str]) -> (str, str):
+        main_idea = self._main_idea(concept_dict)
+        logger.debug("Generating questions (async) for main idea: %s", main_idea[:80])
+        prompt = self._build_prompt(main_idea, passages, num_questions)
         try:
-            result = self.llm_invoke.llm_response(prompt)
+            result = await self.llm_invoke.allm_response(prompt)
             logger.info("Generated raw output for main idea: %s", main_idea[:80])
             return result["answer"], main_idea
         except Exception as e:
             logger.error("Error generating questions for main idea: %s, Error: %s", main_idea[:80], e, exc_info=True)
             return "", main_idea
 
+    @staticmethod
+    async def _bounded(semaphore: asyncio.Semaphore, coro):
+        try:
+            async with semaphore:
+                return await coro
+        finally:
+            coro.close()  # no-op once awaited; discards it if cancelled while queued
+
+    @staticmethod
+    def _extract_json_array(text: str, start: int = 0) -> str:
+        """
+        Return the first balanced JSON array in text beginning at or after start,
+        or "" if there is none. Single pass tracking bracket depth; brackets inside
+        JSON strings are ignored.
+        """
+        start = text.find("[", start)
+        if start < 0:
+            return ""
+
+        depth, in_str, skip_until = 0, False, -1
+        # Jump between structural characters instead of stepping through every char
+        for m in _JSON_SCAN_RE.finditer(text, start):
+            i, ch = m.start(), m.group()
+            if i < skip_until:
+                continue  # character escaped by a preceding backslash
+            if in_str:
+                if ch == "\\":
+                    skip_until = i + 2
+                elif ch == '"':
+                    in_str = False
+            elif ch == '"':
+                in_str = True
+            elif ch == "[":
+                depth += 1
+            elif ch == "]":
+                depth -= 1
+                if depth == 0:
+                    return text[start:i + 1]
+        return ""
+
     @staticmethod
     def _clean_and_add_ground_truth(raw_output: str, main_idea: str) -> List[Dict]:
         """Remove code fences, parse JSON, and add ground_truth field to each question."""
-        cleaned = re.sub(r"^```json\s*|\s*```$", "", raw_output.strip())
-        match = re.search(r"\[.*\]", cleaned, re.DOTALL)
-        if match:
-            try:
-                questions = json.loads(match.group(0))
-                for q in questions:
-                    q["ground_truth"] = main_idea
-                return questions
-            except json.JSONDecodeError as e:
-                logger.warning("Failed to parse JSON for main idea: %s, Error: %s", main_idea[:80], e)
-                return []
+        cleaned = raw_output.strip().removeprefix("```json").removeprefix("```").removesuffix("```").strip()
+        # The first bracketed span may be prose like "section [1]"; keep scanning from
+        # the next "[" until a candidate parses as a list containing question objects
+        start = cleaned.find("[")
+        while start >= 0:
+            array_text = QuestionGenerator._extract_json_array(cleaned, start)
+            if array_text:
+                try:
+                    candidate = orjson.loads(array_text)
+                except orjson.JSONDecodeError:
+                    candidate = None
+                if isinstance(candidate, list):
+                    questions = [q for q in candidate if isinstance(q, dict)]
+                    if questions:
+                        for q in questions:
+                            q["ground_truth"] = main_idea
+                        return questions
+            start = cleaned.find("[", start + 1)
+
+        logger.warning("No JSON question array found for main idea: %s", main_idea[:80])
         return []
 
-    def generate_questions(self, ranked_concepts: List[Dict], num_questions: int = 2, save_path: str = None) -> Dict:
-        all_questions_json = {"questions": []}
+    async def stream_questions(self, ranked_concepts: List[Dict], num_questions: int = 2) -> AsyncIterator[Dict]:
+        """
+        Issue concept prompts concurrently (at most max_concurrent in flight) with the
+        async Gemini client and yield each parsed question as soon as its concept's
+        response arrives.
+        """
         logger.info("Starting generation of questions for %d concepts.", len(ranked_concepts))
+        main_ideas = [self._main_idea(concept_dict) for concept_dict in ranked_concepts]
+        # Retrieve passages for each distinct main idea with one batched FAISS search
+        # (PassageExtractor caches per query); embedding + search is blocking, so keep
+        # it off the event loop
+        distinct = list(dict.fromkeys(main_ideas))
+        fetched = await asyncio.to_thread(self.passage_extractor.batch_extract, distinct)
+        passages_by_idea = dict(zip(distinct, fetched))
+        passages_per_concept = [passages_by_idea[idea] for idea in main_ideas]
 
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            futures = [
-                executor.submit(self._generate_single, concept_dict, num_questions)
-                for concept_dict in ranked_concepts
-            ]
-            for future in as_completed(futures):
-                raw_output, main_idea = future.result()
-                parsed = self._clean_and_add_ground_truth(raw_output, main_idea)
-                all_questions_json["questions"].extend(parsed)
-                logger.debug("Added %d questions for main idea: %s", len(parsed), main_idea[:80])
-
-        if save_path:
-            try:
-                with open(save_path, "w") as f:
-                    json.dump(all_questions_json, f, indent=2)
-                logger.info("Saved generated questions to %s", save_path)
-            except Exception as e:
-                logger.error("Failed to save questions to %s: %s", save_path, e, exc_info=True)
-
-        logger.info("Question generation completed. Total questions: %d", len(all_questions_json["questions"]))
-        return all_questions_json
+        semaphore = asyncio.Semaphore(self.max_concurrent)
+        tasks = [
+            asyncio.create_task(
+                self._bounded(semaphore, self._agenerate_single(concept_dict, num_questions, passages))
+            )
+            for concept_dict, passages in zip(ranked_concepts, passages_per_concept)
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                raw_output, main_idea = await next_done
+                try:
+                    parsed = self._clean_and_add_ground_truth(raw_output, main_idea)
+                except Exception as e:
+                    # One unparseable reply must not end the stream for the other concepts
+                    logger.error("Failed to parse questions for main idea: %s, Error: %s",
+                                 main_idea[:80], e, exc_info=True)
+                    continue
+                logger.debug("Generated %d questions for main idea: %s", len(parsed), main_idea[:80])
+                for question in parsed:
+                    yield question
+        finally:
+            # If the consumer stops early (e.g. the SSE client disconnected), stop the
+            # remaining Gemini calls instead of letting them spend quota in the background
+            pending = [task for task in tasks if not task.done()]
+            for task in pending:
+                task.cancel()
+            if pending:
+                logger.info("Cancelled %d pending question generation tasks.", len(pending))
+
+    async def generate_questions_async(self, ranked_concepts: List[Dict], save_path: str,
+                                       num_questions: int = 2) -> int:
+        """
+        Generate questions for all concepts and write each one to save_path as an
+        NDJSON line as soon as it is parsed, so only a running count is kept in memory.
+        The file is truncated at the start of each run. Returns the number of questions.
+        """
+        count = 0
+        async with aiofiles.open(save_path, "wb") as f:
+            async for question in self.stream_questions(ranked_concepts, num_questions):
+                await f.write(orjson.dumps(question, option=orjson.OPT_APPEND_NEWLINE))
+                count += 1
 
+        logger.info("Question generation completed. Saved %d questions to %s", count, save_path)
+        return count
 
+    def generate_questions(self, ranked_concepts: List[Dict], save_path: str, num_questions: int = 2) -> int:
+        """Synchronous wrapper around generate_questions_async (not for use inside a running event loop)."""
+        return asyncio.run(self.generate_questions_async(ranked_concepts, save_path, num_questions))
 
 
 
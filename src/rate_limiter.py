@@ -0,0 +1,63 @@
+# src/rate_limiter.py
+# This file implements a token-bucket limiter for provider requests/min and tokens/min quotas
+import asyncio
+import os
+import threading
+import time
+from typing import Optional
+from src.utils import get_logger
+
+logger = get_logger(__name__)
+
+
+class TokenBucket:
+    """
+    Thread-safe limiter over two optional buckets: requests per minute and
+    tokens per minute. Each call reserves its share up front, so buckets may go
+    into debt and callers wait in arrival order until the debt is refilled.
+    Blocking threads and asyncio tasks can share the same instance.
+    """
+    def __init__(self, rpm: Optional[int] = None, tpm: Optional[int] = None):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = float(rpm or 0)
+        self._tokens = float(tpm or 0)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+        logger.info("TokenBucket initialized with rpm=%s, tpm=%s", rpm, tpm)
+
+    @classmethod
+    def from_env(cls) -> Optional["TokenBucket"]:
+        """Build a limiter from LLM_RPM / LLM_TPM; returns None when neither limit is set."""
+        rpm = int(os.getenv("LLM_RPM", "0"))
+        tpm = int(os.getenv("LLM_TPM", "0"))
+        return cls(rpm or None, tpm or None) if rpm > 0 or tpm > 0 else None
+
+    def _reserve(self, estimated_tokens: int) -> float:
+        """Refill both buckets, take this call's share and return how long to wait."""
+        with self._lock:
+            now = time.monotonic()
+            elapsed, self._last = now - self._last, now
+
+            wait = 0.0
+            if self.rpm:
+                self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60) - 1
+                wait = -self._requests * 60 / self.rpm
+            if self.tpm:
+                self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60) - estimated_tokens
+                wait = max(wait, -self._tokens * 60 / self.tpm)
+            return max(0.0, wait)
+
+    def acquire(self, estimated_tokens: int = 1) -> None:
+        """Block until both buckets have room for one request of estimated_tokens."""
+        wait = self._reserve(estimated_tokens)
+        if wait:
+            logger.debug("Rate limit reached; waiting %.2fs", wait)
+            time.sleep(wait)
+
+    async def acquire_async(self, estimated_tokens: int = 1) -> None:
+        """Async variant of acquire that waits without blocking the event loop."""
+        wait = self._reserve(estimated_tokens)
+        if wait:
+            logger.debug("Rate limit reached; waiting %.2fs", wait)
+            await asyncio.sleep(wait)
@@ -1,11 +1,28 @@
 # src/token_counter.py
+import logging
+import os
 import tiktoken
+from functools import lru_cache
 from typing import List, Tuple
 from langchain.schema import Document
 from src.utils import get_logger
 
+# Optional Rust BPE backend (pip install rs-bpe): same vocabularies as tiktoken,
+# with a rayon-parallel batch encoder used for bulk counting.
+try:
+    from rs_bpe.bpe import openai as rs_openai
+except ImportError:
+    rs_openai = None
+
 logger = get_logger(__name__)
 
+
+@lru_cache(maxsize=4)
+def _get_encoder(name: str):
+    """Load a tiktoken encoding once per process; later TokenCounters share it."""
+    return tiktoken.get_encoding(name)
+
+
 class TokenCounter:
     """
     TokenCounter for estimating token usage per text or document.
@@ -14,18 +31,45 @@ class TokenCounter:
     def __init__(self, model: str = "cl100k_base"):
         self.model = model
         try:
-            self.encoder = tiktoken.get_encoding(self.model)
-            logger.info("TokenCounter initialized with model: %s", self.model)
+            self.encoder = _get_encoder(self.model)
+            self._backend, self._mode = self.encoder, "tiktoken"
+            if rs_openai is not None and hasattr(rs_openai, self.model):
+                self._backend, self._mode = getattr(rs_openai, self.model)(), "rs"
+            # Per-instance cache: a method-level lru_cache would key on self, keep every
+            # counter alive and share one cache across all of them
+            self._encode_len = lru_cache(maxsize=4096)(self.count_tokens_uncached)
+            logger.info("TokenCounter initialized with model: %s (%s batch backend)", self.model, self._mode)
         except Exception as e:
             logger.error("Failed to initialize TokenCounter with model %s: %s", self.model, e, exc_info=True)
             raise
 
     def count_tokens(self, text: str) -> int:
         """Return number of tokens in a string."""
-        token_count = len(self.encoder.encode(text))
-        logger.debug("Counted %d tokens for text: %s...", token_count, text[:50])
+        token_count = self._encode_len(text)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Counted %d tokens for text: %s...", token_count, text[:50])
         return token_count
 
+    def count_tokens_uncached(self, text: str) -> int:
+        """
+        Return number of tokens in a string without touching the length cache; use for
+        large one-off texts (e.g. whole LLM prompts) that would only evict useful entries.
+        """
+        # encode_ordinary skips the special-token scan; count_tokens wraps this in a
+        # cache because splitter candidates and combiner sets are re-measured repeatedly
+        return len(self.encoder.encode_ordinary(text))
+
+    def count_tokens_batch(self, texts: List[str]) -> List[int]:
+        """Return the token count of each string, encoding them in one parallel batch."""
+        if self._mode == "rs":
+            # Returns (token lists, total tokens, elapsed seconds, threads used)
+            encodings, *_ = self._backend.encode_batch_parallel(
+                texts, rs_openai.ParallelOptions(min_batch_size=20, chunk_size=100, max_threads=0)
+            )
+            return [len(tokens) for tokens in encodings]
+        encodings = self._backend.encode_ordinary_batch(texts, num_threads=os.cpu_count() or 1)
+        return [len(tokens) for tokens in encodings]
+
     def get_total_tokens(self, documents: List[Document]) -> Tuple[int, List[Tuple[int, int, str]]]:
         """
         Calculate total tokens across multiple documents.
@@ -34,22 +78,24 @@ class TokenCounter:
             total_tokens (int): Total token count across all docs
             per_doc (List[Tuple[int, int, str]]): List of (doc_index, tokens, source)
         """
-        total_tokens = 0
-        per_doc = []
-
-        for i, doc in enumerate(documents):
-            tokens = self.count_tokens(doc.page_content)
-            source = doc.metadata.get("source", "unknown")
-            per_doc.append((i, tokens, source))
-            total_tokens += tokens
-            logger.debug("Doc %d (%s) has %d tokens", i, source, tokens)
+        # One batched encode across all documents instead of a call per document
+        token_counts = self.count_tokens_batch([doc.page_content for doc in documents])
+        per_doc = [
+            (i, tokens, doc.metadata.get("source", "unknown"))
+            for i, (doc, tokens) in enumerate(zip(documents, token_counts))
+        ]
+        total_tokens = sum(token_counts)
 
         logger.info("Total tokens across %d documents: %d", len(documents), total_tokens)
         return total_tokens, per_doc
 
 
+# Process-wide default counter; pass it around instead of constructing new ones
+DEFAULT = TokenCounter()
+
+
 if __name__ == "__main__":
-    token_counter = TokenCounter()
+    token_counter = DEFAULT
     sample_text = "Calculate total tokens across multiple documents"
     n_count = token_counter.count_tokens(sample_text)
     logger.info("Sample text token count: %d", n_count)